@@ -1,7 +1,27 @@
+from __future__ import annotations
+
+import asyncio
 import logging
 import os
+import re
+from typing import Awaitable, Callable
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, BotCommand
-from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ContextTypes
+from telegram.error import BadRequest
+from telegram.ext import (
+    AIORateLimiter,
+    Application,
+    CallbackQueryHandler,
+    CommandHandler,
+    ContextTypes,
+    Defaults,
+    filters,
+)
+from telegram.request import HTTPXRequest
+
+try:
+    import uvloop
+except ImportError:  # uvloop is unavailable on Windows
+    uvloop = None
 
 # Configure logging
 logging.basicConfig(
@@ -17,179 +37,136 @@ START_MESSAGE = "Click the button below to play lottery:"
 MENU_TITLE = "📋 Command Menu"
 MENU_FORMAT = "<code>{command}</code>\n{description}"
 
+# Callback data prefix for command buttons
+_CMD_PREFIX = "cmd_"
+_CMD_PREFIX_LEN = len(_CMD_PREFIX)
+
 # Bot commands configuration
-BOT_COMMANDS = [
+BOT_COMMANDS: tuple[BotCommand, ...] = (
     BotCommand("start", "Start the bot"),
     BotCommand("play", "Open Lottery"),
     BotCommand("menu", "Show command menu")
-]
+)
+
+# Static keyboards, built once at import time
+PLAY_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton(BUTTON_TEXT, url=LOTTERY_URL)]
+])
+MENU_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton(f"▶ {cmd.command}", callback_data=f"{_CMD_PREFIX}{cmd.command}")]
+    for cmd in BOT_COMMANDS
+])
+MENU_TEXT = MENU_TITLE + "\n\n" + "\n".join(
+    MENU_FORMAT.format(command=cmd.command, description=cmd.description)
+    for cmd in BOT_COMMANDS
+)
+
+
+# Either Message.reply_text (new message) or CallbackQuery.edit_message_text (in place)
+SendFunc = Callable[..., Awaitable[object]]
+
+
+async def _do_start_reply(send: SendFunc) -> None:
+    """Send the simple startup acknowledgement."""
+    await send(
+        "Bot started. Use /play to open Lottery or /menu to see available commands."
+    )
+
+
+async def _do_play_reply(send: SendFunc) -> None:
+    """Send the lottery button."""
+    await send(
+        START_MESSAGE,
+        reply_markup=PLAY_MARKUP
+    )
+
+
+async def _do_menu_reply(send: SendFunc) -> None:
+    """Send the command menu."""
+    await send(
+        MENU_TEXT,
+        parse_mode='HTML',
+        reply_markup=MENU_MARKUP
+    )
+
+
+# Map command names (from callback data) to their reply helpers
+CMD_DISPATCH = {
+    "start": _do_start_reply,
+    "play": _do_play_reply,
+    "menu": _do_menu_reply,
+}
+# Only callback data naming a known command reaches button_callback
+CMD_PATTERN = re.compile(
+    rf"^{re.escape(_CMD_PREFIX)}({'|'.join(map(re.escape, CMD_DISPATCH))})$"
+)
+
+
+def _user_id(update: Update) -> int | str:
+    """Return the id of the user behind an update, for logging."""
+    user = update.effective_user
+    return user.id if user else "?"
 
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle the /start command (simple startup acknowledgement)."""
-    try:
-        if not update.message:
-            logger.warning("Received update without message in start handler")
-            return
-
-        await update.message.reply_text(
-            "Bot started. Use /play to open Lottery or /menu to see available commands."
-        )
-        logger.info(f"Start acknowledgement sent to user {update.effective_user.id}")
-    except Exception as e:
-        logger.error(f"Error in start handler: {e}", exc_info=True)
-        if update.message:
-            try:
-                await update.message.reply_text(
-                    "Sorry, an error occurred. Please try again later."
-                )
-            except Exception:
-                logger.error("Failed to send error message to user")
+    await _do_start_reply(update.message.reply_text)
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("Start acknowledgement sent to user %s", _user_id(update))
 
 
 async def play_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle the /play command (moved from /start)."""
-    try:
-        if not update.message:
-            logger.warning("Received update without message in play handler")
-            return
-
-        keyboard = [
-            [InlineKeyboardButton(BUTTON_TEXT, url=LOTTERY_URL)]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-
-        await update.message.reply_text(
-            START_MESSAGE,
-            reply_markup=reply_markup
-        )
-        logger.info(f"Play command executed by user {update.effective_user.id}")
-    except Exception as e:
-        logger.error(f"Error in play handler: {e}", exc_info=True)
-        if update.message:
-            try:
-                await update.message.reply_text(
-                    "Sorry, an error occurred. Please try again later."
-                )
-            except Exception:
-                logger.error("Failed to send error message to user")
+    await _do_play_reply(update.message.reply_text)
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("Play command executed by user %s", _user_id(update))
 
 
 async def menu_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle the /menu command."""
-    try:
-        if not update.message:
-            logger.warning("Received update without message in menu handler")
-            return
-        
-        # Create inline keyboard buttons for each command
-        keyboard = []
-        menu_text = MENU_TITLE
-        
-        for cmd in BOT_COMMANDS:
-            # Create clickable button for each command
-            keyboard.append([
-                InlineKeyboardButton(
-                    f"▶ {cmd.command}",
-                    callback_data=f"cmd_{cmd.command}"
-                )
-            ])
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await update.message.reply_text(
-            menu_text,
-            parse_mode='HTML',
-            reply_markup=reply_markup
-        )
-        logger.info(f"Menu command executed by user {update.effective_user.id}")
-    except Exception as e:
-        logger.error(f"Error in menu handler: {e}", exc_info=True)
-        if update.message:
-            try:
-                await update.message.reply_text(
-                    "Sorry, an error occurred while showing the menu. Please try again later."
-                )
-            except Exception:
-                logger.error("Failed to send error message to user")
+    await _do_menu_reply(update.message.reply_text)
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("Menu command executed by user %s", _user_id(update))
 
 
 async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle button callback queries."""
+    query = update.callback_query
+    if not query.message:
+        logger.warning("Received callback_query without message")
+        await query.answer("Message not found")
+        return
+    
+    log_info = logger.isEnabledFor(logging.INFO)
+    uid = _user_id(update) if log_info else None
+    if log_info:
+        logger.info("Button callback received: %s from user %s", query.data, uid)
+
+    # The handler pattern guarantees a known command
+    command_name = query.data[_CMD_PREFIX_LEN:]
+    reply = CMD_DISPATCH[command_name]
+
+    # The start acknowledgement has no keyboard, so editing the menu into it would
+    # drop the menu; post it as a new message instead
+    if command_name == "start":
+        send = query.message.reply_text
+    else:
+        send = query.edit_message_text
+
+    # Answer the query concurrently with the reply
     try:
-        query = update.callback_query
-        if not query:
-            logger.warning("Received update without callback_query")
-            return
-        
-        if not query.data:
-            logger.warning("Received callback_query without data")
-            await query.answer("Invalid button data")
-            return
-        
-        if not query.message:
-            logger.warning("Received callback_query without message")
-            await query.answer("Message not found")
-            return
-        
-        await query.answer()
-        logger.info(f"Button callback received: {query.data} from user {update.effective_user.id}")
-        
-        # Handle command button clicks
-        if query.data.startswith("cmd_"):
-            command_name = query.data.replace("cmd_", "")
-
-            # Execute the corresponding command
-            if command_name == "start":
-                # Simple start acknowledgement (no heavy processing)
-                await query.message.reply_text(
-                    "Bot started. Use /play to open Lottery or /menu to see available commands."
-                )
-                logger.info(f"Start acknowledgement executed via button by user {update.effective_user.id}")
-
-            elif command_name == "play":
-                # Execute play command logic (opens lottery button)
-                keyboard = [
-                    [InlineKeyboardButton(BUTTON_TEXT, url=LOTTERY_URL)]
-                ]
-                reply_markup = InlineKeyboardMarkup(keyboard)
-                await query.message.reply_text(
-                    START_MESSAGE,
-                    reply_markup=reply_markup
-                )
-                logger.info(f"Play command executed via button by user {update.effective_user.id}")
-
-            elif command_name == "menu":
-                # Re-execute menu command
-                keyboard = []
-                menu_text = MENU_TITLE
-
-                for cmd in BOT_COMMANDS:
-                    keyboard.append([
-                        InlineKeyboardButton(
-                            f"▶ {cmd.command}",
-                            callback_data=f"cmd_{cmd.command}"
-                        )
-                    ])
-
-                reply_markup = InlineKeyboardMarkup(keyboard)
-                await query.message.reply_text(
-                    menu_text,
-                    parse_mode='HTML',
-                    reply_markup=reply_markup
-                )
-                logger.info(f"Menu command executed via button by user {update.effective_user.id}")
-        
-    except Exception as e:
-        logger.error(f"Error in button_callback: {e}", exc_info=True)
-        if update.callback_query:
-            try:
-                await update.callback_query.answer(
-                    "Sorry, an error occurred. Please try again.",
-                    show_alert=True
-                )
-            except Exception:
-                logger.error("Failed to send error answer to user")
+        await asyncio.gather(query.answer(), reply(send))
+    except BadRequest as e:
+        # Re-showing the menu on the menu message leaves nothing to edit
+        if "not modified" not in str(e):
+            raise
+    if log_info:
+        logger.info("Command %s executed via button by user %s", command_name, uid)
+
+
+async def answer_unknown_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Answer callback queries that don't match a known command."""
+    await update.callback_query.answer()
 
 
 async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -197,62 +174,123 @@ async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> N
     logger.error(f"Exception while handling an update: {context.error}", exc_info=context.error)
     
     # Try to send error message to user if update is available
-    if isinstance(update, Update) and update.message:
-        try:
+    if not isinstance(update, Update):
+        return
+
+    try:
+        if update.callback_query:
+            await update.callback_query.answer(
+                "Sorry, an error occurred. Please try again.",
+                show_alert=True
+            )
+        elif update.message:
             await update.message.reply_text(
                 "Sorry, an unexpected error occurred. Please try again later."
             )
-        except Exception:
-            logger.error("Failed to send error message to user")
+    except Exception:
+        logger.error("Failed to send error message to user")
 
 
 async def post_init(application: Application) -> None:
     """Initialize bot commands after application is built."""
     try:
-        # Delete all existing commands first to remove any cached/old commands
-        try:
-            await application.bot.delete_my_commands()
-        except Exception as delete_error:
-            logger.warning(f"Could not delete old commands (this is okay if none exist): {delete_error}")
-        
+        # set_my_commands fully replaces the default scope; only wipe old commands on request
+        if os.getenv("RESET_COMMANDS"):
+            try:
+                await application.bot.delete_my_commands()
+            except Exception as delete_error:
+                logger.warning(f"Could not delete old commands (this is okay if none exist): {delete_error}")
+
         # Set new commands (start, play and menu)
         await application.bot.set_my_commands(BOT_COMMANDS)
         logger.info("Bot commands menu initialized successfully - start, play and menu commands set")
     except Exception as e:
-        logger.error(f"Error in post_init: {e}", exc_info=True)
+        logger.error("Error in post_init: %s", e, exc_info=True)
         # Don't fail the bot startup if command setting fails
 
 
 def main() -> None:
     """Main function to start the bot."""
-    # Get token from environment variable or use fallback
-    TOKEN = os.getenv("BOT_TOKEN", "8494619697:AAG91Y2BkW-_u__Vob7czhcmQoPrxcBijpM")
-    
-    if not TOKEN:
-        logger.error("Bot token not found! Please set BOT_TOKEN environment variable.")
-        return
-    
+    # Use the libuv-backed event loop when available
+    if uvloop is not None:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
+    # Fail fast at startup if the token is not configured
+    TOKEN = os.environ["BOT_TOKEN"]
+
     try:
-        application = Application.builder().token(TOKEN).post_init(post_init).build()
+        # Larger HTTP/2 pool so concurrent handlers don't stall on connection acquisition
+        request = HTTPXRequest(
+            connection_pool_size=256,
+            http_version="2",
+            read_timeout=20,
+            write_timeout=20,
+            connect_timeout=10,
+            pool_timeout=5
+        )
+        get_updates_request = HTTPXRequest(
+            connection_pool_size=1,
+            http_version="2",
+            read_timeout=30
+        )
+
+        application = (
+            Application.builder()
+            .token(TOKEN)
+            .request(request)
+            .get_updates_request(get_updates_request)
+            # Run handlers concurrently instead of serializing updates
+            .defaults(Defaults(block=False))
+            # Pace outgoing requests to stay within Telegram's flood limits
+            .rate_limiter(
+                AIORateLimiter(
+                    overall_max_rate=30,
+                    overall_time_period=1,
+                    group_max_rate=20,
+                    group_time_period=60,
+                    # Wait out Telegram's retry_after and resend instead of failing
+                    max_retries=3
+                )
+            )
+            .post_init(post_init)
+            .build()
+        )
         
         # Add command handlers
-        application.add_handler(CommandHandler("start", start))
-        application.add_handler(CommandHandler("play", play_command))
-        application.add_handler(CommandHandler("menu", menu_command))
+        application.add_handler(CommandHandler("start", start, filters=filters.UpdateType.MESSAGE))
+        application.add_handler(CommandHandler("play", play_command, filters=filters.UpdateType.MESSAGE))
+        application.add_handler(CommandHandler("menu", menu_command, filters=filters.UpdateType.MESSAGE))
         
         # Add callback query handler for inline button clicks
-        application.add_handler(CallbackQueryHandler(button_callback))
+        application.add_handler(CallbackQueryHandler(button_callback, pattern=CMD_PATTERN))
+        # Answer stale or unknown buttons so the client doesn't keep spinning
+        application.add_handler(CallbackQueryHandler(answer_unknown_callback))
         
         # Add error handler
         application.add_error_handler(error_handler)
         
         logger.info("Bot is starting...")
-        print("Bot is running...")
-        application.run_polling(drop_pending_updates=True)
+        if os.getenv("USE_WEBHOOK"):
+            # Let Telegram push updates instead of polling getUpdates
+            host = os.environ["HOST"]
+            application.run_webhook(
+                listen="0.0.0.0",
+                port=int(os.getenv("PORT", 8443)),
+                url_path=TOKEN,
+                webhook_url=f"https://{host}/{TOKEN}",
+                drop_pending_updates=True
+            )
+        else:
+            # Long-poll for the maximum hold so idle getUpdates calls stay rare
+            application.run_polling(
+                drop_pending_updates=True,
+                timeout=30,
+                poll_interval=0.0,
+                bootstrap_retries=-1
+            )
         
     except Exception as e:
         logger.error(f"Failed to start bot: {e}", exc_info=True)
-        print(f"Error starting bot: {e}")
 
 
 if __name__ == "__main__":